@@ -1,12 +1,20 @@
 import os
+import time
+import json
+import hashlib
+from collections import OrderedDict
+from datetime import datetime, timezone
 import numpy as np
 import faiss
 from nltk.tokenize import sent_tokenize
+
+from .dedup import dedup_sentences, normalize_text
+from .document_utils import parse_documents_structurally, merge_chunks_with_empty_titles
  
 
-def build_faiss_index(chunks , model):
+def build_faiss_index(chunks , model, dedup=True):
     """
-    Split chunks into sentences, embed them, and build a FAISS index.
+    Split chunks into sentences, collapse duplicates, embed them, and build a FAISS index.
     """
     all_sentences = []
     sentence_meta = []  # store metadata to map back to document
@@ -22,6 +30,9 @@ def build_faiss_index(chunks , model):
                     "title": chunk["title"]
                 })
 
+    if dedup:
+        all_sentences, sentence_meta = _collapse_duplicates(all_sentences, sentence_meta)
+
     embeddings = model.encode(all_sentences, convert_to_numpy=True)
     embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)  # normalize
 
@@ -31,6 +42,34 @@ def build_faiss_index(chunks , model):
 
     return index, all_sentences, sentence_meta
 
+def _collapse_duplicates(all_sentences, sentence_meta):
+    """
+    Keep one sentence per duplicate cluster. The representative's metadata gets a
+    "locations" list with the metadata of every sentence in its cluster.
+    """
+    representatives, cluster_of = dedup_sentences(all_sentences)
+
+    unique_meta = [dict(sentence_meta[i], locations=[]) for i in representatives]
+    for i, cluster in enumerate(cluster_of):
+        unique_meta[cluster]["locations"].append(sentence_meta[i])
+
+    return [all_sentences[i] for i in representatives], unique_meta
+
+def _result_locations(metas):
+    """
+    Distinct (document, page, section) locations for a result, in order of appearance.
+    """
+    locations = []
+    for meta in metas:
+        location = {
+            "document": meta["doc_name"],
+            "page_number": meta["page_num"],
+            "section_title": meta["title"]
+        }
+        if location not in locations:
+            locations.append(location)
+    return locations
+
 def semantic_search(model , query, index, all_sentences, sentence_meta, top_k=5, threshold=0.7):
     """
     Return the top_k most relevant sentences for the query.
@@ -48,7 +87,276 @@ def semantic_search(model , query, index, all_sentences, sentence_meta, top_k=5,
                 "page_number": sentence_meta[idx]["page_num"],
                 "section_title": sentence_meta[idx]["title"],
                 "refined_text": all_sentences[idx],
-                "score": float(score)
+                "score": float(score),
+                "locations": _result_locations(sentence_meta[idx].get("locations", [sentence_meta[idx]]))
             })
 
     return results[1:]
+
+
+def _normalize(embeddings):
+    return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+def _section_windows(chunk, model):
+    """
+    Split a section into windows that fit the model's max_seq_length, so text past
+    the first ~256 tokens of a long page is not silently truncated away.
+    """
+    # leave room for [CLS]/[SEP] and the title that prefixes every window
+    window_tokens = max(32, model.max_seq_length - 34)
+    content = chunk["content"]
+    offsets = model.tokenizer(content, add_special_tokens=False, return_offsets_mapping=True, verbose=False)["offset_mapping"]
+
+    windows = []
+    for start in range(0, len(offsets), window_tokens):
+        span = offsets[start:start + window_tokens]
+        windows.append(f"{chunk['title']}. {content[span[0][0]:span[-1][1]]}")
+    return windows or [chunk["title"]]
+
+def build_section_index(chunks, model):
+    """
+    Embed each section (title + content, in windows of at most max_seq_length
+    tokens) and build a coarse FAISS index over the windows.
+    Sentence embeddings are computed lazily by hierarchical_search.
+    """
+    window_texts = []
+    window_section = []  # window id -> section id
+    for section_id, chunk in enumerate(chunks):
+        for window in _section_windows(chunk, model):
+            window_texts.append(window)
+            window_section.append(section_id)
+
+    embeddings = _normalize(model.encode(window_texts, convert_to_numpy=True))
+
+    index = faiss.IndexFlatIP(embeddings.shape[1])
+    index.add(embeddings)
+
+    return {
+        "index": index,
+        "window_section": window_section,
+        "chunks": chunks,
+        "sentences": {},  # section id -> (sentences, normalized embeddings)
+        "vectors": {},  # normalized sentence text -> embedding, shared across sections
+    }
+
+def _section_sentences(model, section_index, section_id):
+    """
+    Split and embed a section's sentences on first use, then reuse the cache.
+    """
+    cache = section_index["sentences"]
+    if section_id not in cache:
+        chunk = section_index["chunks"][section_id]
+        sentences = [s for s in sent_tokenize(chunk["content"]) if s.strip()]
+        representatives, _ = dedup_sentences(sentences)
+        sentences = [sentences[i] for i in representatives]
+
+        # sentences repeated across sections are only embedded once
+        vectors = section_index["vectors"]
+        missing = list({normalize_text(s): s for s in sentences if normalize_text(s) not in vectors}.items())
+        if missing:
+            embeddings = _normalize(model.encode([s for _, s in missing], convert_to_numpy=True))
+            for (key, _), emb in zip(missing, embeddings):
+                vectors[key] = emb
+
+        embeddings = np.array([vectors[normalize_text(s)] for s in sentences]) if sentences else None
+        cache[section_id] = (sentences, embeddings)
+    return cache[section_id]
+
+def hierarchical_search(model, query, section_index, top_k=5, threshold=0.7, top_sections=10):
+    """
+    Coarse search over sections, then re-rank sentences inside the top sections only.
+    Returns results in the same format as semantic_search.
+    """
+    if top_sections < 1:
+        raise ValueError(f"top_sections must be at least 1, got {top_sections}")
+
+    query_emb = _normalize(model.encode([query], convert_to_numpy=True))
+
+    n_windows = section_index["index"].ntotal
+    if n_windows == 0:
+        return []
+    _, W = section_index["index"].search(query_emb, n_windows)
+
+    # a section scores as its best window (max-pooling); windows come back best first
+    top_section_ids = []
+    for window_id in W[0]:
+        section_id = section_index["window_section"][window_id]
+        if section_id not in top_section_ids:
+            top_section_ids.append(section_id)
+            if len(top_section_ids) == top_sections:
+                break
+
+    candidates = []
+    for section_id in top_section_ids:
+        sentences, embeddings = _section_sentences(model, section_index, section_id)
+        if not sentences:
+            continue
+        scores = embeddings @ query_emb[0]
+        chunk = section_index["chunks"][section_id]
+        for sent, score in zip(sentences, scores):
+            candidates.append((float(score), sent, chunk))
+
+    candidates.sort(key=lambda c: c[0], reverse=True)
+
+    # collapse duplicates across the visited sections, keeping the best-scoring copy
+    # and the sections of every copy
+    representatives, cluster_of = dedup_sentences([sent for _, sent, _ in candidates])
+    cluster_chunks = [[] for _ in representatives]
+    for i, cluster in enumerate(cluster_of):
+        cluster_chunks[cluster].append(candidates[i][2])
+    results = []
+
+    for cluster, rep in enumerate(representatives[:top_k]):
+        score, sent, chunk = candidates[rep]
+        if score >= threshold:
+            results.append({
+                "document": chunk["doc_name"],
+                "page_number": chunk["page_num"],
+                "section_title": chunk["title"],
+                "refined_text": sent,
+                "score": score,
+                "locations": _result_locations(cluster_chunks[cluster])
+            })
+
+    # keep parity with semantic_search, which drops its first hit
+    return results[1:]
+
+def _parse_top_sections(value):
+    try:
+        top_sections = int(value)
+    except ValueError:
+        top_sections = 0
+    if top_sections < 1:
+        raise ValueError(f"RETRIEVAL_TOP_SECTIONS must be an integer >= 1, got {value!r}")
+    return top_sections
+
+RETRIEVAL_TOP_SECTIONS = _parse_top_sections(os.getenv("RETRIEVAL_TOP_SECTIONS", "10"))
+
+_SECTION_INDEX_CACHE = OrderedDict()  # document set fingerprint -> section index
+_SECTION_INDEX_CACHE_SIZE = 8
+
+def get_section_index(chunks, model):
+    """
+    Return the section index for this document set, building it only the first time.
+    Keeping it across requests lets later queries reuse the sentence embeddings
+    that earlier queries computed lazily.
+    """
+    fingerprint = hashlib.sha1(json.dumps(
+        [[c["doc_name"], c["page_num"], c["title"], c["content"]] for c in chunks]
+    ).encode("utf-8")).hexdigest()
+
+    if fingerprint in _SECTION_INDEX_CACHE:
+        _SECTION_INDEX_CACHE.move_to_end(fingerprint)
+    else:
+        _SECTION_INDEX_CACHE[fingerprint] = build_section_index(chunks, model)
+        if len(_SECTION_INDEX_CACHE) > _SECTION_INDEX_CACHE_SIZE:
+            _SECTION_INDEX_CACHE.popitem(last=False)
+    return _SECTION_INDEX_CACHE[fingerprint]
+
+def search_chunks(chunks, model, query, top_k=5, threshold=0.7):
+    """
+    Index the chunks and search them, using the strategy selected by RETRIEVAL_MODE
+    ("flat" sentence index, or "hierarchical" section -> sentence search, whose
+    index is kept across calls for the same documents).
+    """
+    mode = os.getenv("RETRIEVAL_MODE", "flat").lower()
+    if mode == "hierarchical":
+        section_index = get_section_index(chunks, model)
+        return hierarchical_search(model, query, section_index, top_k=top_k, threshold=threshold, top_sections=RETRIEVAL_TOP_SECTIONS)
+
+    index, all_sentences, sentence_meta = build_faiss_index(chunks, model)
+    return semantic_search(model, query, index, all_sentences, sentence_meta, top_k=top_k, threshold=threshold)
+
+def compare_with_flat(chunks, model, query, top_k=50, threshold=0.6, top_sections=10):
+    """
+    Run the original flat search (every sentence embedded, no dedup) and the
+    hierarchical search on the same chunks, and report how many flat hits the
+    hierarchical search recovers, how many texts each embedded, and timings.
+    """
+    start = time.perf_counter()
+    index, all_sentences, sentence_meta = build_faiss_index(chunks, model, dedup=False)
+    flat = semantic_search(model, query, index, all_sentences, sentence_meta, top_k=top_k, threshold=threshold)
+    flat_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    section_index = build_section_index(chunks, model)
+    hier = hierarchical_search(model, query, section_index, top_k=top_k, threshold=threshold, top_sections=top_sections)
+    hier_time = time.perf_counter() - start
+
+    def keys(r):
+        # a collapsed hit covers every location its duplicates came from
+        return {(loc["document"], loc["page_number"], r["refined_text"]) for loc in r["locations"]}
+
+    flat_keys = set().union(*map(keys, flat))
+    hier_keys = set().union(*map(keys, hier))
+
+    return {
+        "flat_results": len(flat),
+        "hierarchical_results": len(hier),
+        "overlap": len(flat_keys & hier_keys),
+        "recall": len(flat_keys & hier_keys) / len(flat_keys) if flat_keys else 1.0,
+        "flat_texts_embedded": len(all_sentences),
+        "hierarchical_windows_embedded": section_index["index"].ntotal,
+        "hierarchical_sentences_embedded": len(section_index["vectors"]),
+        "flat_seconds": round(flat_time, 3),
+        "hierarchical_seconds": round(hier_time, 3),
+    }
+
+def analyze_documents(file_paths, persona, task, model):
+    """
+    Persona/task analysis behind /analyze/: parse the PDFs, retrieve the most
+    relevant sentences and group them by document.
+    """
+    chunks = parse_documents_structurally(file_paths)
+    chunks = merge_chunks_with_empty_titles(chunks)
+    base_query = f"As a {persona}, my goal is to {task}."
+
+    relevant_sentences = search_chunks(chunks , model , base_query, top_k=50, threshold=0.6)
+
+    # Group sentences by document and title
+    doc_map = {}
+    for i, sentence in enumerate(relevant_sentences):
+        doc_name = sentence["document"]
+        if doc_name not in doc_map:
+            doc_map[doc_name] = {
+                "filename": doc_name,
+                "sections": []
+            }
+        doc_map[doc_name]["sections"].append({
+            "title": sentence["section_title"],
+            "page": sentence["page_number"],
+            "importance_rank": i + 1,  # rank by FAISS score order
+            "content": sentence["refined_text"],
+            "relevance_score": round(sentence["score"], 3),
+            "locations": sentence["locations"]
+        })
+
+    return {
+        "persona": persona,
+        "task": task,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "documents": list(doc_map.values())
+    }
+
+
+if __name__ == "__main__":
+    # python -m app.analyzer --compare [pdf_dir]: evaluate hierarchical vs flat retrieval
+    import argparse
+    import glob
+    from .models import load_models
+
+    parser = argparse.ArgumentParser(description="Compare hierarchical retrieval against the flat sentence index.")
+    parser.add_argument("--compare", action="store_true", required=True)
+    parser.add_argument("pdf_dir", nargs="?", default="input")
+    parser.add_argument("--persona", default="Travel Planner")
+    parser.add_argument("--task", default="Plan a trip of 4 days for a group of 10 college friends.")
+    parser.add_argument("--top-sections", type=int, nargs="+", default=[5, 10, 20])
+    args = parser.parse_args()
+
+    model = load_models()
+    chunks = merge_chunks_with_empty_titles(parse_documents_structurally(sorted(glob.glob(os.path.join(args.pdf_dir, "*.pdf")))))
+    query = f"As a {args.persona}, my goal is to {args.task}."
+
+    for top_sections in args.top_sections:
+        report = compare_with_flat(chunks, model, query, top_sections=top_sections)
+        print(json.dumps({"top_sections": top_sections, **report}))
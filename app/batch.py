@@ -0,0 +1,130 @@
+"""
+Offline batch runner: analyze every collection under a directory without the API.
+
+Each collection is a folder holding an input JSON (same shape as /analyze/'s
+input_json: persona, job_to_be_done, documents) and its PDFs, either next to the
+JSON or in a PDFs/ subfolder. The output JSON matches the /analyze/ response.
+
+Usage (from the repo root, so the model path resolves):
+    python -m app.batch collections/ --workers 4
+"""
+import argparse
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import torch
+
+from .models import load_models
+from .analyzer import analyze_documents
+
+INPUT_NAME = "challenge1b_input.json"
+OUTPUT_NAME = "challenge1b_output.json"
+# every worker holds its own torch runtime and model copy, so stay conservative
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+
+
+def find_collections(root, input_name=INPUT_NAME):
+    """
+    Return every directory under root that contains an input JSON.
+    """
+    collections = []
+    for dirpath, _, filenames in os.walk(root):
+        if input_name in filenames:
+            collections.append(dirpath)
+    return sorted(collections)
+
+def process_collection(collection_dir, model, input_name=INPUT_NAME, output_name=OUTPUT_NAME):
+    """
+    Analyze one collection and write its output JSON atomically, so an
+    interrupted run never leaves a half-written file that looks complete.
+    """
+    with open(os.path.join(collection_dir, input_name), encoding="utf-8") as f:
+        input_json = json.load(f)
+
+    persona = input_json["persona"]["role"]
+    task = input_json["job_to_be_done"]["task"]
+    documents = input_json["documents"]
+
+    pdf_dir = os.path.join(collection_dir, "PDFs")
+    if not os.path.isdir(pdf_dir):
+        pdf_dir = collection_dir
+    file_paths = [os.path.join(pdf_dir, doc["filename"]) for doc in documents]
+
+    # parse_documents_structurally skips unreadable files; fail instead, so no
+    # incomplete output is written and the collection is retried on the next run
+    missing = [path for path in file_paths if not os.path.isfile(path)]
+    if missing:
+        raise FileNotFoundError(f"Missing documents: {', '.join(missing)}")
+
+    output = analyze_documents(file_paths, persona, task, model)
+
+    output_path = os.path.join(collection_dir, output_name)
+    tmp_path = output_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(output, f, indent=4, ensure_ascii=False)
+    os.replace(tmp_path, output_path)
+    return output_path
+
+_worker_model = None
+
+def _init_worker(num_threads):
+    """
+    Load the embedding model once per worker process. PyMuPDF is not thread-safe
+    and parsing / tokenizing / dedup hold the GIL, so workers are processes.
+    """
+    global _worker_model
+    torch.set_num_threads(num_threads)
+    _worker_model = load_models()
+
+def _run_collection(collection_dir, input_name, output_name):
+    return process_collection(collection_dir, _worker_model, input_name, output_name)
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze all document collections under a directory.")
+    parser.add_argument("root", help="Directory tree containing collections")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Worker processes, each with its own model copy (default: min(4, cores))")
+    parser.add_argument("--input-name", default=INPUT_NAME, help="Input JSON filename inside each collection")
+    parser.add_argument("--output-name", default=OUTPUT_NAME, help="Output JSON filename inside each collection")
+    parser.add_argument("--force", action="store_true", help="Re-process collections that already have an output")
+    args = parser.parse_args()
+
+    collections = find_collections(args.root, args.input_name)
+    if not args.force:
+        # resume: skip collections finished by an earlier run
+        collections = [c for c in collections if not os.path.exists(os.path.join(c, args.output_name))]
+
+    if not collections:
+        print("Nothing to process.")
+        return
+
+    workers = max(1, min(args.workers, len(collections)))
+    # share the cores between workers instead of every encode using all of them
+    num_threads = max(1, (os.cpu_count() or 1) // workers)
+
+    print(f"Processing {len(collections)} collection(s) with {workers} worker(s)")
+    failed = 0
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(num_threads,),
+    ) as executor:
+        futures = {
+            executor.submit(_run_collection, c, args.input_name, args.output_name): c
+            for c in collections
+        }
+        for future in as_completed(futures):
+            collection = futures[future]
+            try:
+                print(f"Done: {future.result()}")
+            except Exception as e:
+                failed += 1
+                print(f"Error processing {collection}: {e}")
+
+    if failed:
+        raise SystemExit(f"{failed} collection(s) failed")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import re
+import zlib
+import numpy as np
+
+NUM_PERM = 64
+BANDS = 16  # 16 bands x 4 rows -> candidates from ~Jaccard 0.5 upwards
+SHINGLE_SIZE = 3
+SIMILARITY_THRESHOLD = 0.8
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_rng = np.random.RandomState(42)
+_PERM_A = _rng.randint(1, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.randint(0, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+
+
+def normalize_text(text):
+    """
+    Lowercase and strip punctuation / extra whitespace so trivial variants hash the same.
+    """
+    return re.sub(r'\s+', ' ', re.sub(r'[^\w\s]', ' ', text.lower())).strip()
+
+def _shingles(norm_text):
+    words = norm_text.split()
+    if len(words) <= SHINGLE_SIZE:
+        return {norm_text}
+    return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+def _minhash(shingles):
+    hashes = np.array([zlib.crc32(s.encode("utf-8")) for s in shingles], dtype=np.uint64)
+    return ((_PERM_A[:, None] * hashes[None, :] + _PERM_B[:, None]) % _MERSENNE_PRIME).min(axis=1)
+
+def _jaccard(a, b):
+    return len(a & b) / len(a | b)
+
+def dedup_sentences(sentences, threshold=SIMILARITY_THRESHOLD):
+    """
+    Cluster exact and near-duplicate sentences.
+
+    Exact duplicates (after normalize_text) are merged by hashing; the remaining
+    unique sentences are grouped with MinHash + LSH banding and confirmed with the
+    true shingle Jaccard similarity.
+
+    Returns (representatives, cluster_of): representatives lists the index of the
+    first sentence of each cluster, and cluster_of[i] is the cluster id of sentence i.
+    """
+    # Stage 1: exact hashing
+    key_to_first = {}
+    first_of = []
+    for i, sent in enumerate(sentences):
+        key = normalize_text(sent)
+        first_of.append(key_to_first.setdefault(key, i))
+
+    unique = list(key_to_first.values())  # in order of first appearance
+    parent = {i: i for i in unique}
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    # Stage 2: MinHash/LSH over the exact-unique sentences
+    shingles = {i: _shingles(normalize_text(sentences[i])) for i in unique}
+    rows = NUM_PERM // BANDS
+    buckets = {}
+    for i in unique:
+        if not shingles[i]:
+            continue
+        sig = _minhash(shingles[i])
+        for band in range(BANDS):
+            buckets.setdefault((band, sig[band * rows:(band + 1) * rows].tobytes()), []).append(i)
+
+    for members in buckets.values():
+        for pos, a in enumerate(members):
+            for b in members[pos + 1:]:
+                root_a, root_b = find(a), find(b)
+                if root_a != root_b and _jaccard(shingles[a], shingles[b]) >= threshold:
+                    # keep the earliest sentence as the cluster representative
+                    parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    representatives = []
+    cluster_ids = {}
+    cluster_of = []
+    for i in range(len(sentences)):
+        root = find(first_of[i])
+        if root not in cluster_ids:
+            cluster_ids[root] = len(representatives)
+            representatives.append(root)
+        cluster_of.append(cluster_ids[root])
+
+    return representatives, cluster_of
@@ -4,14 +4,13 @@ from fastapi.middleware.cors import CORSMiddleware
 import os
 import json
 import uuid
-from datetime import datetime, timezone
 from pydantic import BaseModel
 from typing import List
 from fastapi.staticfiles import StaticFiles
 
 from .models import load_models
 from .document_utils import parse_documents_structurally, merge_chunks_with_empty_titles
-from .analyzer import  build_faiss_index , semantic_search
+from .analyzer import  search_chunks , analyze_documents
 from utils.gemini_model import model_answer , generate_key_insights , generate_counterpoints , generate_podcast_script , generate_did_you_know
 from podcast import create_podcast_from_script
  
@@ -98,37 +97,7 @@ async def analyze_pdfs(request: Request):
 
     file_paths = [file_map[doc["filename"]] for doc in documents]
 
-    # --- your existing logic ---
-    chunks = parse_documents_structurally(file_paths)
-    chunks = merge_chunks_with_empty_titles(chunks)
-    base_query = f"As a {persona}, my goal is to {task}."
-
-    index, all_sentences, sentence_meta = build_faiss_index(chunks , embedding_model)
-    relevant_sentences = semantic_search(embedding_model , base_query, index, all_sentences, sentence_meta, top_k=50, threshold=0.6)
-
-    # Group sentences by document and title
-    doc_map = {}
-    for i, sentence in enumerate(relevant_sentences):
-        doc_name = sentence["document"]
-        if doc_name not in doc_map:
-            doc_map[doc_name] = {
-                "filename": doc_name,
-                "sections": []
-            }
-        doc_map[doc_name]["sections"].append({
-            "title": sentence["section_title"],
-            "page": sentence["page_number"],
-            "importance_rank": i + 1,  # rank by FAISS score order
-            "content": sentence["refined_text"],
-            "relevance_score": round(sentence["score"], 3)
-        })
-
-    output = {
-        "persona": persona,
-        "task": task,
-        "timestamp": datetime.now(timezone.utc).isoformat(),
-        "documents": list(doc_map.values())
-    }
+    output = analyze_documents(file_paths, persona, task, embedding_model)
 
     return JSONResponse(content=output)
 
@@ -148,8 +117,7 @@ async def analyze_pdfs_text(request: Request):
     chunks = parse_documents_structurally(file_paths)
     chunks = merge_chunks_with_empty_titles(chunks)
 
-    index, all_sentences, sentence_meta = build_faiss_index(chunks , embedding_model)
-    output_chunks = semantic_search( embedding_model , text, index, all_sentences, sentence_meta, top_k=10, threshold=0.65)
+    output_chunks = search_chunks(chunks , embedding_model , text, top_k=10, threshold=0.65)
 
 
     output = {"sub_section_analysis": output_chunks}
@@ -231,8 +199,7 @@ async def generate_podcast(request: Request):
     chunks = parse_documents_structurally(file_paths)
     chunks = merge_chunks_with_empty_titles(chunks)
 
-    index, all_sentences, sentence_meta = build_faiss_index(chunks , embedding_model)
-    output_chunks = semantic_search( embedding_model , text, index, all_sentences, sentence_meta, top_k=10, threshold=0.65)
+    output_chunks = search_chunks(chunks , embedding_model , text, top_k=10, threshold=0.65)
     
     # ----- Step 2: Key Insights -----
     insights_output = generate_key_insights(text)